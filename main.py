@@ -2,11 +2,12 @@ import datetime
 
 from src.trading_classes import *
 from src.slack_app_notification import *
+from src.run_journal import RunJournal
 from slack import WebClient
 from slack.errors import SlackApiError
 
 
-def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_crypto=30):
+def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_crypto=30, cycle_id=None):
     """
     Description: Uses your Alpaca API credentials (including whether you're paper trading or live trading based on BASE_URL) and
     sells overbought assets in portfolio then buys oversold assets in the market per YahooFinance! opportunities.
@@ -16,6 +17,8 @@ def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_
         • end_hr_for_message: ending hour for interval for considering when Slack notification will be sent
         • n_stocks: number of top losing stocks from YahooFinance! to be considered for trades
         • n_crypto: number of top traded/valued crypto assets from YahooFinance! to be considered for trades
+        • cycle_id: identifies the run in the run journal; by default a run that died within the last 2 hours before
+          finishing its buy orders is resumed from its last completed stage, otherwise a new cycle is started
     """
     config = configparser.ConfigParser()
     config.read("creds.cfg")
@@ -31,32 +34,44 @@ def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_
         base_url=BASE_URL,
     )
 
+    # Checkpoints each stage below so a retried run picks up where the last attempt died
+    journal = RunJournal(cycle_id=cycle_id)
+
     ##############################
     ##############################
     ### Run TradingOpps class
 
-    # Instantiate TradingOpportunities class
-    trades = TradingOpportunities(n_stocks=n_stocks, n_crypto=n_crypto)
+    if journal.is_complete("scrape"):
+        buy_tickers = journal.get("buy_tickers")
+    else:
+        # Instantiate TradingOpportunities class
+        trades = TradingOpportunities(n_stocks=n_stocks, n_crypto=n_crypto)
+
+        # Shows all scraped opportunities; defaults to 25 top losing stocks and 25 of the most popular crypto assets
+        trades.get_trading_opportunities()
 
-    # Shows all scraped opportunities; defaults to 25 top losing stocks and 25 of the most popular crypto assets
-    trades.get_trading_opportunities()
+        # The all_tickers attribute is a list of all tickers in the get_trading_opportunities() method. Passing this list through the get_asset_info() method shows just the tickers that meet buying criteria
+        trades.get_asset_info()
 
-    # The all_tickers attribute is a list of all tickers in the get_trading_opportunities() method. Passing this list through the get_asset_info() method shows just the tickers that meet buying criteria
-    trades.get_asset_info()
+        buy_tickers = trades.buy_tickers
+        journal.complete("scrape", buy_tickers=buy_tickers)
 
     ##############################
     ##############################
     ### Run Alpaca class
 
     # Instantiate Alpaca class
-    Alpaca_instance = Alpaca(api=api)
+    Alpaca_instance = Alpaca(api=api, journal=journal)
 
     # Liquidates currently held assets that meet sell criteria and stores sales in a df
-    Alpaca_instance.sell_orders()
+    if not journal.is_complete("sell"):
+        Alpaca_instance.sell_orders()
+        journal.complete("sell")
 
-    # Execute buy_orders using trades.buy_tickers and stores buys in a tickers_bought list
-    Alpaca_instance.buy_orders(tickers=trades.buy_tickers)
-    Alpaca_instance.tickers_bought
+    # Execute buy_orders using buy_tickers and stores buys in a tickers_bought list
+    if not journal.is_complete("buy"):
+        Alpaca_instance.buy_orders(tickers=buy_tickers)
+        journal.complete("buy")
 
     ##############################
     ##############################
@@ -72,7 +87,9 @@ def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_
     current_time = datetime.now(pytz.timezone("CET"))
     hour = current_time.hour
 
-    if st_hr_for_message <= hour < end_hr_for_message:
+    if journal.is_complete("notify"):
+        print("Message already sent this cycle")
+    elif st_hr_for_message <= hour < end_hr_for_message:
         print("• Sending message")
 
         # Authenticate to the Slack API via the generated token
@@ -93,6 +110,7 @@ def main(days_hist=1, st_hr_for_message=6, end_hr_for_message=9, n_stocks=30, n_
                 mrkdwn=True,  # Enable Markdown formatting
             )
             print("Message sent successfully")
+            journal.complete("notify")
         except SlackApiError as e:
             print(f"Error sending message: {e}")
     else:
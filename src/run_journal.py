@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import pytz
+
+from datetime import datetime
+
+
+class OrderLookupError(Exception):
+    """
+    Description:
+    Raised when a resumed cycle can't tell whether the broker already has an order. The run should stop here rather than
+    risk a duplicate, so the next run resumes the cycle and looks the order up again.
+    """
+
+
+class RunJournal:
+    def __init__(self, cycle_id=None, journal_dir="run_journal", resume_max_age_hours=2, max_age_hours=48):
+        """
+        Description:
+        Per-cycle journal that checkpoints each completed stage of main() and every order submitted so a retried
+        run resumes where the previous one died instead of re-scraping YahooFinance! or submitting duplicate orders.
+
+        Arguments:
+            • cycle_id: identifies the run; by default the newest cycle that never got through its buy stage is resumed
+              if written within resume_max_age_hours, otherwise a new cycle named after the current UTC hour
+              (e.g. "2023051214") is started
+            • journal_dir: folder where journal files are kept; persist it between runs (see circleci/config.yml)
+            • resume_max_age_hours: unfinished journals older than this aren't resumed since their scrape and order plans
+              are stale; keep it below the gap between scheduled runs so each scheduled run still trades
+            • max_age_hours: journals untouched for longer than this are deleted and never resumed
+
+        Methods:
+            • is_complete(): checks whether a stage already finished during this cycle
+            • complete(): marks a stage as finished and stores any data later stages need
+            • set(): stores data without marking a stage as finished (e.g. an order plan)
+            • get(): returns data stored by complete() or set()
+            • client_order_id(): deterministic Alpaca client_order_id for a cycle, purpose and symbol
+            • has_order(): checks whether an order was already recorded for this cycle
+            • record_order(): stores a submitted order in the journal
+        """
+
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+
+        self._prune(max_age_hours)
+
+        if cycle_id is None:
+            cycle_id = self._unfinished_cycle(resume_max_age_hours) or datetime.now(pytz.utc).strftime("%Y%m%d%H")
+
+        self.cycle_id = str(cycle_id)
+        self.path = os.path.join(journal_dir, self.cycle_id + ".json")
+
+        # A journal file for this cycle only exists if a previous attempt got at least one checkpoint in
+        self.resumed = os.path.exists(self.path)
+
+        if self.resumed:
+            with open(self.path) as f:
+                self.state = json.load(f)
+            print("• Resuming cycle " + self.cycle_id + " after stages: " + ", ".join(self.state["completed_stages"]))
+        else:
+            self.state = {"cycle_id": self.cycle_id, "completed_stages": [], "data": {}, "orders": {}}
+
+    def _journal_paths(self):
+        """
+        Description: Returns the paths of all journal files in journal_dir
+        """
+
+        return [os.path.join(self.journal_dir, name) for name in os.listdir(self.journal_dir) if name.endswith(".json")]
+
+    def _prune(self, max_age_hours):
+        """
+        Description:
+        Deletes journals untouched for longer than max_age_hours so the folder (and the CircleCI cache holding it)
+        doesn't grow with every run. Orders that old are long past being retried.
+
+        Argument(s):
+            • max_age_hours: age past which a journal is deleted
+        """
+
+        cutoff = time.time() - max_age_hours * 3600
+        for path in self._journal_paths():
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+
+    def _unfinished_cycle(self, resume_max_age_hours):
+        """
+        Description:
+        Returns the id of the most recently written cycle that never completed its buy stage, or None. A rerun picks
+        this up so an attempt that died isn't left behind under an old cycle id.
+
+        Argument(s):
+            • resume_max_age_hours: journals last written longer ago than this are left alone
+        """
+
+        cutoff = time.time() - resume_max_age_hours * 3600
+
+        unfinished = []
+        for path in self._journal_paths():
+            if os.path.getmtime(path) < cutoff:
+                continue
+            with open(path) as f:
+                state = json.load(f)
+            if "buy" not in state["completed_stages"]:
+                unfinished.append((os.path.getmtime(path), state["cycle_id"]))
+
+        if not unfinished:
+            return None
+
+        return max(unfinished)[1]
+
+    def _save(self):
+        """
+        Description:
+        Writes the journal to a temp file then swaps it in so a crash mid-write never leaves a corrupt journal behind.
+        """
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, stage):
+        """
+        Description: Returns True if the stage already finished during this cycle
+
+        Argument(s):
+            • stage: name of the stage (e.g. "scrape", "sell", "buy", "notify")
+        """
+
+        return stage in self.state["completed_stages"]
+
+    def complete(self, stage, **data):
+        """
+        Description: Marks a stage as finished and stores any data the following stages need on a resumed run
+
+        Argument(s):
+            • stage: name of the stage being checkpointed
+            • data: JSON serializable values to keep, retrievable later with get()
+        """
+
+        self.state["data"].update(data)
+        if stage not in self.state["completed_stages"]:
+            self.state["completed_stages"].append(stage)
+        self._save()
+
+    def set(self, key, value):
+        """
+        Description: Stores data for a resumed run without marking any stage as finished
+
+        Argument(s):
+            • key: name to store the data under, retrievable later with get()
+            • value: JSON serializable value to keep
+        """
+
+        self.state["data"][key] = value
+        self._save()
+
+    def get(self, key, default=None):
+        """
+        Description: Returns data stored by complete() or set()
+
+        Argument(s):
+            • key: name the data was stored under
+            • default: returned if nothing was stored under key
+        """
+
+        return self.state["data"].get(key, default)
+
+    def client_order_id(self, purpose, symbol):
+        """
+        Description:
+        Builds the same client_order_id every time for a given cycle, purpose and symbol. Alpaca rejects a second order
+        with an existing client_order_id, and the id lets a resumed run look up a single order instead of rescanning.
+
+        Argument(s):
+            • purpose: why the order is placed (e.g. "sell", "cash", "buy") so a symbol can get more than one order per cycle
+            • symbol: Alpaca symbol being traded
+        """
+
+        # Alpaca caps client_order_id at 128 characters
+        return "tb-{}-{}-{}".format(self.cycle_id, purpose, symbol)[:128]
+
+    def has_order(self, client_order_id):
+        """
+        Description: Returns True if an order with this client_order_id was already recorded during this cycle
+
+        Argument(s):
+            • client_order_id: id built by client_order_id()
+        """
+
+        return client_order_id in self.state["orders"]
+
+    def record_order(self, client_order_id, **details):
+        """
+        Description: Stores a submitted order in the journal straight away so a crash right after submitting isn't repeated
+
+        Argument(s):
+            • client_order_id: id built by client_order_id()
+            • details: order details worth keeping (e.g. symbol, side, qty, notional)
+        """
+
+        self.state["orders"][client_order_id] = details
+        self._save()
@@ -8,6 +8,7 @@ import locale
 import pandas_market_calendars as mcal
 
 from alpaca_py.rest import APIError
+from src.run_journal import OrderLookupError
 from ta.volatility import BollingerBands
 from ta.momentum import RSIIndicator
 from ta.trend import sma_indicator
@@ -181,18 +182,20 @@ class TradingOpportunities:
 
 
 class Alpaca:
-    def __init__(self, api):
+    def __init__(self, api, journal=None):
         """
         Description: Object providing Alpaca balance details and executes buy/sell trades
 
         Arguments:
         • api: this object should be created before instantiating the class and it should contain your Alpaca keys
-        •
+        • journal: optional RunJournal; when passed, orders get deterministic client_order_ids and orders already placed during the cycle are skipped
 
         Methods:
         • get_current_positions(): shows current balance of Alpaca account
         """
 
+        self.journal = journal
+
         config = configparser.ConfigParser()
         config.read('creds.cfg')
 
@@ -271,6 +274,53 @@ class Alpaca:
 
         return False
 
+    def submit_order(self, purpose, **order):
+        """
+        Description:
+        Submits an order through the Alpaca API unless it was already placed during this cycle per the journal.
+
+        Argument(s):
+        • purpose: why the order is placed (e.g. "sell", "cash", "buy"), used to build the client_order_id
+        • order: keyword arguments passed on to api.submit_order()
+
+        Returns the submitted order, or the broker's order if it already had it, or None if an earlier attempt of this
+        cycle already placed it.
+        """
+
+        if self.journal is None:
+            return self.api.submit_order(**order)
+
+        client_order_id = self.journal.client_order_id(purpose, order['symbol'])
+
+        if self.journal.has_order(client_order_id):
+            print("• skipping " + order['symbol'] + " " + purpose + " order already placed this cycle")
+            return None
+
+        # Only a resumed cycle can have orders the journal missed (crash between submit and record), so only then
+        # check with the broker, and just for this one client_order_id
+        if self.journal.resumed:
+            try:
+                existing = self.api.get_order_by_client_order_id(client_order_id)
+            except APIError as e:
+                # Only a 404 means the order was never placed; on anything else stop instead of risking a duplicate
+                if getattr(e, 'status_code', None) != 404:
+                    raise OrderLookupError(f"couldn't look up order {client_order_id}: {e}") from e
+                existing = None
+            except Exception as e:
+                raise OrderLookupError(f"couldn't look up order {client_order_id}: {e}") from e
+
+            # Counts as placed whatever its status: a canceled, rejected or expired order was still this cycle's
+            # decision for the symbol, and Alpaca won't take its client_order_id again anyway
+            if existing is not None:
+                self.journal.record_order(client_order_id, status=str(getattr(existing, 'status', '')), **order)
+                print("• skipping " + order['symbol'] + " " + purpose + " order already at broker")
+                return existing
+
+        submitted = self.api.submit_order(client_order_id=client_order_id, **order)
+        self.journal.record_order(client_order_id, **order)
+
+        return submitted
+
     def sell_orders(self):
         """
         Description:
@@ -280,9 +330,88 @@ class Alpaca:
         • self.df_current_positions: Needed to inform how much of each position should be sold.
         """
 
-        # Get the current time in Eastern Time
-        et_tz = pytz.timezone('US/Eastern')
-        current_time = datetime.now(et_tz)
+        # Reuse the plan of an interrupted attempt so positions aren't rescanned and the cash requirement isn't
+        # recomputed from balances left after its orders
+        sell_plan = self.journal.get('sell_plan') if self.journal is not None else None
+
+        if sell_plan is None:
+            sell_plan = self.plan_sell_orders()
+
+            if self.journal is not None:
+                self.journal.set('sell_plan', sell_plan)
+
+        # Submit sell orders for eligible symbols
+        executed_sales = []
+        for symbol, qty in sell_plan['sales']:
+            try:
+                print("• selling " + str(symbol))
+                placed = self.submit_order(
+                    'sell',
+                    symbol=symbol,
+                    time_in_force='gtc',
+                    qty=qty,
+                    side="sell"
+                )
+                if placed is not None:
+                    executed_sales.append([symbol, round(qty)])
+            except OrderLookupError:
+                raise
+            except Exception as e:
+                continue
+
+        executed_sales_df = pd.DataFrame(executed_sales, columns=['ticker', 'quantity'])
+
+        self.sold_message = sell_plan['sold_message']
+        print(self.sold_message)
+
+        cash_needed = sell_plan['cash_needed']
+
+        if cash_needed is not None:
+            for symbol, amount_to_sell in sell_plan['cash_sales']:
+                print("• selling " + str(symbol) + " for 10% portfolio cash requirement")
+
+                # If the amount_to_sell is zero or an APIError occurs, continue to the next iteration
+                if amount_to_sell == 0:
+                    continue
+
+                try:
+                    placed = self.submit_order(
+                        'cash',
+                        symbol=symbol,
+                        time_in_force="day",
+                        type="market",
+                        notional=amount_to_sell,
+                        side="sell"
+                    )
+                    if placed is not None:
+                        executed_sales.append([symbol, amount_to_sell])
+                except APIError:
+                    continue
+
+            # Convert cash_needed to a string with dollar sign and commas, falling back to plain formatting if the
+            # US locale isn't installed rather than crashing after the orders above went through
+            try:
+                locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
+                cash_needed_str = locale.currency(cash_needed, grouping=True)
+            except (locale.Error, ValueError):
+                cash_needed_str = f"${cash_needed:,.2f}"
+
+            print("• Sold " + cash_needed_str + " of top 25% of performing assets to reach 10% cash position")
+
+        return executed_sales_df
+
+    def plan_sell_orders(self):
+        """
+        Description:
+        Works out which positions sell_orders() should liquidate based on technical signals and how much of the top
+        performers to sell to keep 10% of the portfolio in cash, without submitting anything.
+
+        Returns a dict with:
+        • sales: [symbol, qty] pairs to sell based on the sell criteria
+        • sold_message: summary of the sell criteria sales
+        • cash_sales: [symbol, notional] pairs to sell for the 10% cash requirement
+        • cash_needed: cash the cash_sales should free up, or None if cash is already at least 10%
+        """
 
         # Define the sell criteria
         TradeOpps = TradingOpportunities()
@@ -305,36 +434,24 @@ class Alpaca:
         else:
             eligible_symbols = [symbol for symbol in symbols if "-USD" in symbol]
 
-            # Submit sell orders for eligible symbols
-        executed_sales = []
+        sales = []
         for symbol in eligible_symbols:
-            try:
-                if symbol in symbols:  # Check if the symbol is in the sell_filtered_df
-                    print("• selling " + str(symbol))
-                    qty = df_current_positions[df_current_positions['asset'] == symbol]['qty'].values[0]
-                    self.api.submit_order(
-                        symbol=symbol,
-                        time_in_force='gtc',
-                        qty=qty,
-                        side="sell"
-                    )
-                    executed_sales.append([symbol, round(qty)])
-            except Exception as e:
-                continue
-
-        executed_sales_df = pd.DataFrame(executed_sales, columns=['ticker', 'quantity'])
+            qty = df_current_positions[df_current_positions['asset'] == symbol]['qty'].values
+            if len(qty) > 0:
+                sales.append([symbol, float(qty[0])])
 
         if len(eligible_symbols) == 0:
-            self.sold_message = "• liquidated no positions based on the sell criteria"
+            sold_message = "• liquidated no positions based on the sell criteria"
         else:
-            self.sold_message = f"• executed sell orders for {''.join([symbol + ', ' if i < len(eligible_symbols) - 1 else 'and ' + symbol for i, symbol in enumerate(eligible_symbols)])}based on the sell criteria"
-
-        print(self.sold_message)
+            sold_message = f"• executed sell orders for {''.join([symbol + ', ' if i < len(eligible_symbols) - 1 else 'and ' + symbol for i, symbol in enumerate(eligible_symbols)])}based on the sell criteria"
 
         # Check if the Cash row in df_current_positions is at least 10% of total holdings
         cash_row = df_current_positions[df_current_positions['asset'] == 'Cash']
         total_holdings = df_current_positions['market_value'].sum()
 
+        cash_sales = []
+        cash_needed = None
+
         if cash_row['market_value'].values[0] / total_holdings < 0.1:
             # Sort the df_current_positions by profit_pct descending
             df_current_positions = df_current_positions.sort_values(by=['profit_pct'], ascending=False)
@@ -342,37 +459,18 @@ class Alpaca:
             # Sell the top 25% of performing assets evenly to make Cash 10% of the total portfolio
             top_half = df_current_positions.iloc[:len(df_current_positions) // 4]
             top_half_market_value = top_half['market_value'].sum()
-            cash_needed = total_holdings * 0.1 - cash_row['market_value'].values[0]
+            cash_needed = float(total_holdings * 0.1 - cash_row['market_value'].values[0])
 
             for index, row in top_half.iterrows():
-                print("• selling " + str(row['asset']) + " for 10% portfolio cash requirement")
                 amount_to_sell = int((row['market_value'] / top_half_market_value) * cash_needed)
+                cash_sales.append([row['asset'], amount_to_sell])
 
-                # If the amount_to_sell is zero or an APIError occurs, continue to the next iteration
-                if amount_to_sell == 0:
-                    continue
-
-                try:
-                    self.api.submit_order(
-                        symbol=row['asset'],
-                        time_in_force="day",
-                        type="market",
-                        notional=amount_to_sell,
-                        side="sell"
-                    )
-                    executed_sales.append([row['asset'], amount_to_sell])
-                except APIError:
-                    continue
-
-            # Set the locale to the US
-            locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
-
-            # Convert cash_needed to a string with dollar sign and commas
-            cash_needed_str = locale.currency(cash_needed, grouping=True)
-
-            print("• Sold " + cash_needed_str + " of top 25% of performing assets to reach 10% cash position")
-
-        return executed_sales_df
+        return {
+            'sales': sales,
+            'sold_message': sold_message,
+            'cash_sales': cash_sales,
+            'cash_needed': cash_needed
+        }
 
     def buy_orders(self, tickers):
         """
@@ -384,38 +482,53 @@ class Alpaca:
         • symbols: Assets to be purchased.
         """
 
-        # Get the current positions and available cash
-        df_current_positions = self.get_current_positions()
-        available_cash = df_current_positions[df_current_positions['asset'] == 'Cash']['market_value'].values[0]
-
-        # Get the current time in Eastern Time
-        et_tz = pytz.timezone('US/Eastern')
-        current_time = datetime.now(et_tz)
+        # Reuse the plan of an interrupted attempt so the cash split isn't recomputed from what's left after its orders
+        buy_plan = self.journal.get('buy_plan') if self.journal is not None else None
 
-        # Determine whether to trade all symbols or only those with "-USD" in their name
-        if self.is_market_open():
-            eligible_symbols = tickers
+        if buy_plan is not None:
+            available_cash = buy_plan['available_cash']
+            eligible_symbols = buy_plan['eligible_symbols']
         else:
-            eligible_symbols = [symbol for symbol in tickers if "-USD" in symbol]
+            # Get the current positions and available cash
+            df_current_positions = self.get_current_positions()
+            available_cash = float(df_current_positions[df_current_positions['asset'] == 'Cash']['market_value'].values[0])
+
+            # Determine whether to trade all symbols or only those with "-USD" in their name
+            if self.is_market_open():
+                eligible_symbols = tickers
+            else:
+                eligible_symbols = [symbol for symbol in tickers if "-USD" in symbol]
+
+            if self.journal is not None:
+                self.journal.set('buy_plan', {'available_cash': available_cash,
+                                              'eligible_symbols': eligible_symbols})
 
             # Submit buy orders for eligible symbols
+        tickers_bought = []
         for symbol in eligible_symbols:
             try:
                 if len(symbol) >= 6:
-                    self.api.submit_order(
+                    placed = self.submit_order(
+                        'buy',
                         symbol=symbol,
                         time_in_force='gtc',
                         notional=available_cash / len(eligible_symbols),
                         side="buy"
                     )
                 else:
-                    self.api.submit_order(
+                    placed = self.submit_order(
+                        'buy',
                         symbol=symbol,
                         type='market',
                         notional=available_cash / len(eligible_symbols),
                         side="buy"
                     )
 
+                if placed is not None:
+                    tickers_bought.append(symbol)
+
+            except OrderLookupError:
+                raise
             except Exception as e:
                 continue
 
@@ -426,4 +539,4 @@ class Alpaca:
 
         print(self.bought_message)
 
-        self.tickers_bought = eligible_symbols
+        self.tickers_bought = tickers_bought
@@ -0,0 +1,304 @@
+import os
+import time
+import pytest
+
+from datetime import datetime
+from src.run_journal import OrderLookupError, RunJournal
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubApi:
+    """
+    Description: Stands in for the Alpaca REST client, recording submitted orders and answering client_order_id lookups
+    """
+
+    def __init__(self, broker_orders=None, lookup_error=None):
+        self.broker_orders = broker_orders or {}
+        self.lookup_error = lookup_error
+        self.submitted = []
+        self.lookups = []
+
+    def submit_order(self, **order):
+        self.submitted.append(order)
+        return order
+
+    def get_order_by_client_order_id(self, client_order_id):
+        self.lookups.append(client_order_id)
+        if self.lookup_error is not None:
+            raise self.lookup_error
+        return self.broker_orders[client_order_id]
+
+
+@pytest.fixture
+def trading_classes():
+    return pytest.importorskip("src.trading_classes")
+
+
+def not_called(*args, **kwargs):
+    raise AssertionError("should not be called on a resumed cycle")
+
+
+def make_alpaca(trading_classes, api, journal):
+    # Skip __init__ since it reads creds.cfg and builds a real REST client
+    alpaca = trading_classes.Alpaca.__new__(trading_classes.Alpaca)
+    alpaca.api = api
+    alpaca.journal = journal
+    return alpaca
+
+
+def api_error(trading_classes, status_code):
+    class StubApiError(trading_classes.APIError):
+        def __init__(self):
+            Exception.__init__(self, "status " + str(status_code))
+
+    StubApiError.status_code = status_code
+    return StubApiError()
+
+
+def test_new_cycle_is_not_resumed(tmp_path):
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+
+    assert not journal.resumed
+    assert not journal.is_complete("scrape")
+
+
+def test_resumes_newest_cycle_without_buy_checkpoint(tmp_path):
+    finished = RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path))
+    finished.complete("scrape", buy_tickers=[])
+    finished.complete("sell")
+    finished.complete("buy")
+
+    unfinished = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    unfinished.complete("scrape", buy_tickers=["BTC-USD"])
+
+    journal = RunJournal(journal_dir=str(tmp_path))
+
+    assert journal.resumed
+    assert journal.cycle_id == "2023051214"
+    assert journal.get("buy_tickers") == ["BTC-USD"]
+
+
+def test_finished_cycle_starts_a_new_one(tmp_path):
+    finished = RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path))
+    finished.complete("buy")
+
+    journal = RunJournal(journal_dir=str(tmp_path))
+
+    assert not journal.resumed
+    assert journal.cycle_id != "2023051205"
+
+
+def test_set_does_not_mark_a_stage(tmp_path):
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    journal.set("buy_plan", {"available_cash": 100.0, "eligible_symbols": ["BTCUSD"]})
+
+    resumed = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+
+    assert resumed.state["completed_stages"] == []
+    assert resumed.get("buy_plan")["available_cash"] == 100.0
+
+
+def test_does_not_resume_unfinished_cycle_past_resume_window(tmp_path):
+    stale = RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path))
+    stale.complete("scrape", buy_tickers=["AAPL"])
+    written = time.time() - 3 * 3600
+    os.utime(stale.path, (written, written))
+
+    journal = RunJournal(journal_dir=str(tmp_path), resume_max_age_hours=2)
+
+    assert not journal.resumed
+    assert journal.cycle_id != "2023051205"
+    assert os.path.exists(stale.path)
+
+
+def test_prunes_old_journals(tmp_path):
+    old = RunJournal(cycle_id="2023051014", journal_dir=str(tmp_path))
+    old.complete("scrape", buy_tickers=[])
+    stale = time.time() - 72 * 3600
+    os.utime(old.path, (stale, stale))
+
+    journal = RunJournal(journal_dir=str(tmp_path))
+
+    assert not os.path.exists(old.path)
+    assert not journal.resumed
+
+
+def test_fresh_cycle_submits_with_client_order_id(tmp_path, trading_classes):
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    api = StubApi()
+    alpaca = make_alpaca(trading_classes, api, journal)
+
+    alpaca.submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    assert api.submitted == [{"client_order_id": "tb-2023051214-buy-BTCUSD", "symbol": "BTCUSD", "notional": 10.0, "side": "buy"}]
+    assert api.lookups == []
+    assert journal.has_order("tb-2023051214-buy-BTCUSD")
+
+
+def test_resumed_cycle_skips_order_in_journal(tmp_path, trading_classes):
+    first = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    make_alpaca(trading_classes, StubApi(), first).submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    api = StubApi()
+    alpaca = make_alpaca(trading_classes, api, RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)))
+    alpaca.submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    assert api.submitted == []
+    assert api.lookups == []
+
+
+def test_resumed_cycle_skips_order_only_at_broker(tmp_path, trading_classes):
+    RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)).complete("scrape", buy_tickers=["BTC-USD"])
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    api = StubApi(broker_orders={"tb-2023051214-buy-BTCUSD": object()})
+    alpaca = make_alpaca(trading_classes, api, journal)
+
+    alpaca.submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    assert api.submitted == []
+    assert api.lookups == ["tb-2023051214-buy-BTCUSD"]
+    assert journal.has_order("tb-2023051214-buy-BTCUSD")
+
+
+def test_resumed_cycle_submits_when_broker_has_no_order(tmp_path, trading_classes):
+    RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)).complete("scrape", buy_tickers=["BTC-USD"])
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    api = StubApi(lookup_error=api_error(trading_classes, 404))
+    alpaca = make_alpaca(trading_classes, api, journal)
+
+    alpaca.submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    assert len(api.submitted) == 1
+
+
+def test_resumed_cycle_stops_when_lookup_fails(tmp_path, trading_classes):
+    RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)).complete("scrape", buy_tickers=["BTC-USD"])
+    journal = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    api = StubApi(lookup_error=api_error(trading_classes, 500))
+    alpaca = make_alpaca(trading_classes, api, journal)
+
+    with pytest.raises(OrderLookupError):
+        alpaca.submit_order("buy", symbol="BTCUSD", notional=10.0, side="buy")
+
+    assert api.submitted == []
+    assert not journal.has_order("tb-2023051214-buy-BTCUSD")
+
+
+def test_sell_orders_replays_saved_plan(tmp_path, trading_classes):
+    first = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    first.set("sell_plan", {
+        "sales": [["ETHUSD", 2.0], ["TSLA", 3.0]],
+        "sold_message": "• executed sell orders for ETHUSD, and TSLA based on the sell criteria",
+        "cash_sales": [["MSFT", 250]],
+        "cash_needed": 250.0
+    })
+    first.record_order("tb-2023051214-sell-ETHUSD", symbol="ETHUSD", qty=2.0, side="sell")
+
+    api = StubApi(lookup_error=api_error(trading_classes, 404))
+    alpaca = make_alpaca(trading_classes, api, RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)))
+    alpaca.plan_sell_orders = not_called
+    alpaca.get_current_positions = not_called
+
+    executed_sales_df = alpaca.sell_orders()
+
+    assert [(order["symbol"], order["client_order_id"]) for order in api.submitted] == [
+        ("TSLA", "tb-2023051214-sell-TSLA"),
+        ("MSFT", "tb-2023051214-cash-MSFT"),
+    ]
+    # ETHUSD went out in the earlier attempt so it isn't reported as sold by this run
+    assert list(executed_sales_df["ticker"]) == ["TSLA"]
+
+
+def test_buy_orders_replays_saved_plan(tmp_path, trading_classes):
+    first = RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path))
+    first.set("buy_plan", {"available_cash": 1000.0, "eligible_symbols": ["AAPL", "BTC-USD"]})
+    first.record_order("tb-2023051214-buy-AAPL", symbol="AAPL", notional=500.0, side="buy")
+
+    api = StubApi(lookup_error=api_error(trading_classes, 404))
+    alpaca = make_alpaca(trading_classes, api, RunJournal(cycle_id="2023051214", journal_dir=str(tmp_path)))
+    alpaca.get_current_positions = not_called
+    alpaca.is_market_open = not_called
+
+    alpaca.buy_orders(tickers=["NEW"])
+
+    assert [(order["symbol"], order["notional"]) for order in api.submitted] == [("BTC-USD", 500.0)]
+    assert alpaca.tickers_bought == ["BTC-USD"]
+
+
+class StubAlpaca:
+    def __init__(self, api, journal):
+        self.calls = []
+        StubAlpaca.instance = self
+
+    def sell_orders(self):
+        self.calls.append("sell")
+
+    def buy_orders(self, tickers):
+        self.calls.append("buy")
+        self.tickers_bought = tickers
+
+
+class StubWebClient:
+    error = None
+    messages = []
+
+    def __init__(self, token):
+        pass
+
+    def chat_postMessage(self, **message):
+        if StubWebClient.error is not None:
+            raise StubWebClient.error
+        StubWebClient.messages.append(message)
+
+
+@pytest.fixture
+def main_module(monkeypatch, tmp_path):
+    main = pytest.importorskip("main")
+
+    class MorningInCET(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2023, 5, 12, 7, 0, tzinfo=tz)
+
+    monkeypatch.chdir(REPO_DIR)
+    monkeypatch.setattr(main.tradeapi, "REST", lambda **kwargs: StubApi())
+    monkeypatch.setattr(main, "RunJournal", lambda cycle_id=None: RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path)))
+    monkeypatch.setattr(main, "TradingOpportunities", not_called)
+    monkeypatch.setattr(main, "Alpaca", StubAlpaca)
+    monkeypatch.setattr(main, "WebClient", StubWebClient)
+    monkeypatch.setattr(main, "slack_app_notification", lambda days_hist=1: "")
+    monkeypatch.setattr(main, "datetime", MorningInCET)
+    StubWebClient.error = None
+    StubWebClient.messages = []
+    return main
+
+
+def test_main_skips_checkpointed_stages(tmp_path, main_module):
+    journal = RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path))
+    for stage in ["scrape", "sell", "buy", "notify"]:
+        journal.complete(stage, buy_tickers=["AAPL"])
+
+    main_module.main()
+
+    assert StubAlpaca.instance.calls == []
+    assert StubWebClient.messages == []
+
+
+def test_main_checkpoints_notify_only_after_message_sent(tmp_path, main_module):
+    journal = RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path))
+    journal.complete("scrape", buy_tickers=["AAPL"])
+    journal.complete("sell")
+
+    StubWebClient.error = main_module.SlackApiError("slack is down", {})
+    main_module.main()
+
+    assert StubAlpaca.instance.calls == ["buy"]
+    assert not RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path)).is_complete("notify")
+
+    StubWebClient.error = None
+    main_module.main()
+
+    assert StubAlpaca.instance.calls == []
+    assert len(StubWebClient.messages) == 1
+    assert RunJournal(cycle_id="2023051205", journal_dir=str(tmp_path)).is_complete("notify")